@@ -1,10 +1,256 @@
+import argparse
+import hashlib
+import itertools
+import os
+from dataclasses import dataclass
+from datetime import date
+
 import backtrader as bt
 import yfinance as yf
 import pandas as pd
 import numpy as np
 
+try:
+    from numba import njit, prange
+except ImportError:
+    # Numba is optional: without it the kernels below run as plain Python.
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda fn: fn
+
+    prange = range
+
+STARTING_CASH = 100000.0
+COMMISSION = 0.001
+RISKFREE_RATE = 0.02
+BARS_PER_YEAR = 252 * 6.5  # hourly bars in a US equity trading year
+
+
+# O(1) per-bar state updates. compute_all below is built from these, so a
+# live feed can advance the same state one bar at a time.
+
+@njit('float64(float64, float64, float64)', cache=True, nogil=True)
+def ema_step(prev, x, alpha):
+    return alpha * x + (1.0 - alpha) * prev
+
+
+@njit('float64(float64, float64, int64)', cache=True, nogil=True)
+def wilder_step(prev, x, period):
+    return (prev * (period - 1) + x) / period
+
+
+@njit('float64(float64, float64, float64)', cache=True, nogil=True)
+def true_range(high, low, prev_close):
+    return max(high - low, abs(high - prev_close), abs(low - prev_close))
+
+
+@njit('Tuple((float32[:], float32[:], float32[:]))(float32[:], float32[:], float32[:], int64, int64, int64)',
+      cache=True, nogil=True)
+def compute_all(high, low, close, fast_period, slow_period, atr_period):
+    """Fast EMA, slow EMA and Wilder ATR in a single pass over the bars.
+
+    Each EMA is seeded with the SMA of its first `period` closes and the ATR
+    with the mean of its first `atr_period` true ranges, matching backtrader.
+    Values are NaN until an indicator has warmed up. The running states are
+    float64; only the stored series are float32.
+    """
+    n = close.shape[0]
+    fast = np.full(n, np.nan, np.float32)
+    slow = np.full(n, np.nan, np.float32)
+    atr = np.full(n, np.nan, np.float32)
+    fast_alpha = 2.0 / (fast_period + 1)
+    slow_alpha = 2.0 / (slow_period + 1)
+    fast_ema = 0.0
+    slow_ema = 0.0
+    atr_state = 0.0
+
+    for i in range(n):
+        # float() widens the float32 samples so the states stay float64
+        # even when the kernel runs as plain Python
+        c = float(close[i])
+
+        if i < fast_period:
+            fast_ema += c
+            if i == fast_period - 1:
+                fast_ema /= fast_period
+                fast[i] = fast_ema
+        else:
+            fast_ema = ema_step(fast_ema, c, fast_alpha)
+            fast[i] = fast_ema
+
+        if i < slow_period:
+            slow_ema += c
+            if i == slow_period - 1:
+                slow_ema /= slow_period
+                slow[i] = slow_ema
+        else:
+            slow_ema = ema_step(slow_ema, c, slow_alpha)
+            slow[i] = slow_ema
+
+        if i > 0:
+            tr = true_range(float(high[i]), float(low[i]), float(close[i - 1]))
+            if i <= atr_period:
+                atr_state += tr
+                if i == atr_period:
+                    atr_state /= atr_period
+                    atr[i] = atr_state
+            else:
+                atr_state = wilder_step(atr_state, tr, atr_period)
+                atr[i] = atr_state
+
+    return fast, slow, atr
+
+
+@njit('int8[:](float32[:], float32[:])', cache=True, nogil=True)
+def crossover_nb(fast, slow):
+    """+1 where fast crosses above slow, -1 where it crosses below, 0 elsewhere.
+
+    Works on the int8 sign of fast - slow; a bar whose previous value is still
+    NaN (indicator warm-up) never counts as a cross.
+    """
+    diff = fast - slow
+    sign = (diff > 0.0).astype(np.int8) - (diff < 0.0).astype(np.int8)
+    prev_valid = ~np.isnan(diff[:-1])
+    cross = np.zeros(diff.shape[0], np.int8)
+    up = (sign[1:] > 0) & (sign[:-1] <= 0) & prev_valid
+    down = (sign[1:] < 0) & (sign[:-1] >= 0) & prev_valid
+    cross[1:] = up.astype(np.int8) - down.astype(np.int8)
+    return cross
+
+
+@njit('Tuple((uint8[:], uint8[:]))(float32[:], float32[:])', cache=True, nogil=True)
+def signal_masks(fast, slow):
+    """Per-bar entry (golden cross) and trend-exit (fast below slow) flags as uint8."""
+    entry = (crossover_nb(fast, slow) > 0).astype(np.uint8)
+    trend_exit = (fast < slow).astype(np.uint8)
+    return entry, trend_exit
+
+
+@njit('Tuple((int64[:], int64[:], float64[:], float64[:], float64[:]))('
+      'float32[:], float32[:], uint8[:], uint8[:], float32[:], float64, float64, float64, float64)',
+      cache=True, nogil=True)
+def _run_strategy(open_, close, entry, trend_exit, atr, cash, position_pct, stop_atr, commission):
+    """Trade loop of FinalProfitableStrategy over precomputed signal masks.
+
+    Signals are evaluated on bar close and filled at the next bar's open, like
+    backtrader's market orders. Each trade is sized once at its entry signal
+    and then settled by scanning forward to the first exit signal, without a
+    broker. Prices come in as float32 but cash and P&L are accumulated in
+    float64. Returns (entry_idx, exit_idx, size, pnl) with one row per trade,
+    where a trade still open at the end has exit_idx -1, plus the portfolio
+    value marked to each bar's close.
+    """
+    n = close.shape[0]
+    entry_idx = np.empty(n, np.int64)
+    exit_idx = np.empty(n, np.int64)
+    size = np.empty(n, np.float64)
+    pnl = np.empty(n, np.float64)
+    equity = np.empty(n, np.float64)
+    n_trades = 0
+
+    buy_cost = 1.0 + commission
+    sell_keep = 1.0 - commission
+
+    # Signals are rare, so jump between them instead of visiting every bar
+    entry_bars = np.flatnonzero(entry)
+    trend_exit_bars = np.flatnonzero(trend_exit)
+
+    bar = 0  # first bar whose equity is not yet written; flat from here on
+    for signal in entry_bars:
+        if signal < bar:
+            continue  # still in a trade on this bar
+        if signal >= n - 1:
+            break  # no next bar to fill the order
+        equity[bar:signal + 1] = cash
+
+        # Golden cross: invest position_pct of the (all-cash) portfolio at the
+        # next open, with a wide ATR stop fixed for the life of the trade.
+        # Widen prices to float64 before mixing them into cash and P&L.
+        c = float(close[signal])
+        shares = np.floor(cash * position_pct / c)
+        entry_px = float(open_[signal + 1])
+        if shares < 1.0 or shares * entry_px * buy_cost > cash:
+            bar = signal + 1
+            continue
+        stop_px = c - float(atr[signal]) * stop_atr
+        cash -= shares * entry_px * buy_cost
+        fill = signal + 1
+        entry_idx[n_trades] = fill
+        exit_idx[n_trades] = -1
+        size[n_trades] = shares
+        pnl[n_trades] = 0.0
+        n_trades += 1
+
+        # Exit on the first trend reversal or stop hit from the fill bar on:
+        # look up the next reversal, then search only the bars before it for
+        # the stop. Without either, the trade runs to the last bar.
+        k = np.searchsorted(trend_exit_bars, fill)
+        last = trend_exit_bars[k] if k < trend_exit_bars.shape[0] else n - 1
+        stops = np.flatnonzero(close[fill:last] < stop_px)
+        j = fill + stops[0] if stops.shape[0] > 0 else last
+        equity[fill:j + 1] = cash + shares * close[fill:j + 1]
+        if j == n - 1:
+            # No bar left to fill an exit: the trade stays open
+            return entry_idx[:n_trades], exit_idx[:n_trades], size[:n_trades], pnl[:n_trades], equity
+
+        exit_px = float(open_[j + 1])
+        cash += shares * exit_px * sell_keep
+        exit_idx[n_trades - 1] = j + 1
+        pnl[n_trades - 1] = (exit_px - entry_px) * shares - (entry_px + exit_px) * shares * commission
+        bar = j + 1
+
+    equity[bar:] = cash
+    return entry_idx[:n_trades], exit_idx[:n_trades], size[:n_trades], pnl[:n_trades], equity
+
+
+@njit('float64(float64[:])', cache=True, nogil=True)
+def sharpe_ratio(equity):
+    """Annualized Sharpe ratio of the bar-to-bar returns of an equity curve."""
+    if equity.shape[0] < 2:
+        return 0.0
+    rets = equity[1:] / equity[:-1] - 1.0
+    std = rets.std()
+    if std == 0.0:
+        return 0.0
+    riskfree = (1.0 + RISKFREE_RATE) ** (1.0 / BARS_PER_YEAR) - 1.0
+    return (rets.mean() - riskfree) / std * np.sqrt(BARS_PER_YEAR)
+
+
+def max_drawdown(equity):
+    """Largest peak-to-trough fall of an equity curve, in percent."""
+    peak = np.maximum.accumulate(equity)
+    return float(100.0 * (1.0 - (equity / peak).min()))
+
+
+@njit('float64[:, :](float32[:], float32[:], float32[:], float32[:], float64[:, :], float64, float64, float64)',
+      cache=True, parallel=True)
+def sweep(open_, high, low, close, params, cash, position_pct, commission):
+    """Backtest every (fast, slow, atr_period, stop_atr) row of `params` in parallel.
+
+    Returns one (pnl, trades, wins, sharpe) row per parameter set, counted the
+    same way as BTResult.from_kernel: pnl is marked to the last close so an
+    open position counts, trades includes it, and break-even trades are won.
+    """
+    out = np.empty((params.shape[0], 4))
+    for k in prange(params.shape[0]):
+        fast, slow, atr = compute_all(high, low, close, int(params[k, 0]), int(params[k, 1]), int(params[k, 2]))
+        entry, trend_exit = signal_masks(fast, slow)
+        entry_idx, exit_idx, _, pnl, equity = _run_strategy(open_, close, entry, trend_exit, atr,
+                                                            cash, position_pct, params[k, 3], commission)
+        out[k, 0] = equity[-1] - cash
+        out[k, 1] = entry_idx.shape[0]
+        out[k, 2] = (pnl[exit_idx >= 0] >= 0.0).sum()
+        out[k, 3] = sharpe_ratio(equity)
+    return out
+
+
 class FinalProfitableStrategy(bt.Strategy):
-    
+    """Strategy parameters, and a silent replay of `_run_strategy`'s trades.
+
+    The trading rules live only in the kernel; under backtrader this class just
+    resubmits the kernel's orders so the broker and analyzers can check them.
+    """
 
     params = dict(
         # Trend identification
@@ -15,138 +261,269 @@ class FinalProfitableStrategy(bt.Strategy):
         position_pct=0.95,  # Nearly full investment when in uptrend
         atr_period=14,
         stop_atr_multiplier=8.0,  # Very wide stop
+
+        # (entry_idx, exit_idx, size, pnl) arrays from _run_strategy
+        trades=None,
     )
 
     def __init__(self):
-        self.fast_ema = bt.indicators.EMA(self.data.close, period=self.p.fast_ema)
-        self.slow_ema = bt.indicators.EMA(self.data.close, period=self.p.slow_ema)
-        self.atr = bt.indicators.ATR(self.data, period=self.p.atr_period)
-        
-        self.entry_price = None
-        self.stop_price = None
-        self.trade_count = 0
-
-    def notify_order(self, order):
-        if order.status in [order.Completed]:
-            if order.isbuy():
-                self.entry_price = order.executed.price
-                self.trade_count += 1
-            elif order.issell():
-                self.entry_price = None
-
-    def notify_trade(self, trade):
-        if trade.isclosed:
-            result = "WIN" if trade.pnl > 0 else "LOSS"
-            pnl_pct = (trade.pnlcomm / abs(trade.price * trade.size)) * 100 if trade.size != 0 else 0
-            print(f"Trade #{self.trade_count} [{result}] | P&L: ${trade.pnlcomm:.2f} ({pnl_pct:.2f}%)")
+        # Orders go in one bar before the kernel's fill bar
+        entry_idx, exit_idx, size, _ = self.p.trades
+        self.entries = {int(i) - 1: float(s) for i, s in zip(entry_idx, size)}
+        self.exits = {int(i) - 1 for i in exit_idx if i >= 0}
 
     def next(self):
-        if self.position:
-            # Exit if trend reverses (fast EMA crosses below slow EMA)
-            if self.fast_ema[0] < self.slow_ema[0]:
-                self.close()
-                print(f"EXIT: Trend reversal at ${self.data.close[0]:.2f}")
-                return
-            
-            # Very wide stop loss
-            if self.stop_price and self.data.close[0] < self.stop_price:
-                self.close()
-                print(f"EXIT: Stop loss at ${self.data.close[0]:.2f}")
-                return
-        else:
-            # Enter when fast EMA crosses above slow EMA (golden cross)
-            if (self.fast_ema[0] > self.slow_ema[0] and 
-                self.fast_ema[-1] <= self.slow_ema[-1]):
-                
-                portfolio_value = self.broker.getvalue()
-                size = int((portfolio_value * self.p.position_pct) / self.data.close[0])
-                
-                if size >= 1:
-                    self.buy(size=size)
-                    self.stop_price = self.data.close[0] - (self.atr[0] * self.p.stop_atr_multiplier)
-                    print(f"\nENTRY: ${self.data.close[0]:.2f} | Size: {size} | Stop: ${self.stop_price:.2f}")
-
-
-def run_backtest():
-    cerebro = bt.Cerebro(stdstats=False)
+        bar = len(self.data) - 1
+        if bar in self.exits:
+            self.close()
+        elif bar in self.entries:
+            self.buy(size=self.entries[bar])
+
 
-    print("Downloading SPY 1-hour data...")
-    df = yf.download("SPY", period="730d", interval="1h", progress=False)
+def load_data(ticker="SPY", period="730d", interval="1h", cache_dir="cache"):
+    """Download bars from Yahoo, reusing today's parquet copy if there is one."""
+    key = hashlib.sha1(f"{ticker}|{period}|{interval}|{date.today()}".encode()).hexdigest()
+    path = os.path.join(cache_dir, f"{key}.parquet")
+    if os.path.exists(path):
+        print(f"Loading {ticker} {interval} data from cache...")
+        return pd.read_parquet(path, engine="pyarrow")
+
+    print(f"Downloading {ticker} {interval} data...")
+    try:
+        df = yf.download(ticker, period=period, interval=interval, progress=False,
+                         auto_adjust=True, multi_level_index=False)
+    except TypeError:
+        # multi_level_index only exists from yfinance 0.2.48 on
+        df = yf.download(ticker, period=period, interval=interval, progress=False,
+                         auto_adjust=True)
 
     if isinstance(df.columns, pd.MultiIndex):
-        df.columns = df.columns.droplevel(1)
+        df.columns = df.columns.get_level_values(0)
 
     df.dropna(inplace=True)
-    print(f"Data: {len(df)} bars\n")
+    # yfinance logs failures and returns an empty frame; don't cache that for the day
+    if df.empty:
+        raise RuntimeError(f"No {ticker} {interval} data downloaded from Yahoo; try again later")
 
-    data = bt.feeds.PandasData(dataname=df)
-    cerebro.adddata(data)
-    cerebro.addstrategy(FinalProfitableStrategy)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Keys include the date, so files from earlier days are never read again
+    for name in os.listdir(cache_dir):
+        old_path = os.path.join(cache_dir, name)
+        if name.endswith(".parquet") and date.fromtimestamp(os.path.getmtime(old_path)) < date.today():
+            os.remove(old_path)
+    df.to_parquet(path, engine="pyarrow")
+    return df
 
-    cerebro.broker.setcash(100000)
-    cerebro.broker.setcommission(commission=0.001)
 
-    cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name='sharpe', timeframe=bt.TimeFrame.Minutes, compression=60, riskfreerate=0.02)
-    cerebro.addanalyzer(bt.analyzers.DrawDown, _name='drawdown')
-    cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name='trades')
+def ohlc_arrays(df):
+    """Pull OHLC out of pandas once as contiguous float32 arrays.
 
-    print(f"Starting: ${cerebro.broker.getvalue():,.2f}")
+    float32 keeps well over a cent of precision at SPY's price level and halves
+    the memory the kernels stream. np.array copies, since the kernels' eager
+    signatures reject pandas' read-only views.
+    """
+    return {k: np.array(df[k], dtype=np.float32) for k in ('Open', 'High', 'Low', 'Close')}
+
+
+def run_sweep(df, fast_emas=(20, 50, 100), slow_emas=(100, 200, 300),
+              atr_periods=(14,), stop_atr_multipliers=(4.0, 8.0, 12.0)):
+    arrs = ohlc_arrays(df)
+
+    params = np.array([combo for combo in itertools.product(fast_emas, slow_emas, atr_periods, stop_atr_multipliers)
+                       if combo[0] < combo[1]], dtype=np.float64)
+    p = FinalProfitableStrategy.params
+    results = sweep(arrs['Open'], arrs['High'], arrs['Low'], arrs['Close'], params,
+                    STARTING_CASH, p.position_pct, COMMISSION)
+
+    print("="*60)
+    print(f"PARAMETER SWEEP ({len(params)} combinations, best first)")
+    print("="*60)
+    print(f"{'Fast':>5} {'Slow':>5} {'ATR':>4} {'Stop':>5} {'P&L':>12} {'Trades':>7} {'Won':>4} {'Sharpe':>7}")
+    for k in np.argsort(-results[:, 0]):
+        fast, slow, atr_period, stop_atr = params[k]
+        pnl, total, won, sharpe = results[k]
+        print(f"{fast:5.0f} {slow:5.0f} {atr_period:4.0f} {stop_atr:5.1f} {pnl:+12,.2f} {total:7.0f} {won:4.0f} {sharpe:7.2f}")
     print("="*60 + "\n")
-    
-    results = cerebro.run()
-    strat = results[0]
-    final_value = cerebro.broker.getvalue()
 
+
+def plot_trades(df, fast, slow, trade_log):
+    """Candlestick chart with the EMAs and the kernel's fills overlaid.
+
+    mplfinance draws all up bars and all down bars as one collection each,
+    rather than one matplotlib patch per bar.
+    """
+    import matplotlib.pyplot as plt
+    import mplfinance as mpf
+
+    entry_idx, exit_idx, _, _ = trade_log
+    exit_idx = exit_idx[exit_idx >= 0]
+    fills = np.concatenate((entry_idx, exit_idx))
+    colors = ['green'] * len(entry_idx) + ['red'] * len(exit_idx)
+
+    fig, axes = mpf.plot(df, type='candle', style='charles', returnfig=True,
+                         addplot=[mpf.make_addplot(fast), mpf.make_addplot(slow)],
+                         warn_too_much_data=len(df) + 1)
+    # Without show_nontrading the x axis is the bar index, so fills plot directly
+    axes[0].scatter(fills, df['Open'].to_numpy()[fills], c=colors, s=40, zorder=3)
+    plt.show()
+
+
+def run_kernels(df):
+    """Indicators, signals and the strategy kernel over the bars in `df`."""
+    arrs = ohlc_arrays(df)
+
+    p = FinalProfitableStrategy.params
+    fast, slow, atr = compute_all(arrs['High'], arrs['Low'], arrs['Close'],
+                                  p.fast_ema, p.slow_ema, p.atr_period)
+    entry, trend_exit = signal_masks(fast, slow)
+    *trade_log, equity = _run_strategy(arrs['Open'], arrs['Close'], entry, trend_exit, atr,
+                                       STARTING_CASH, p.position_pct, p.stop_atr_multiplier, COMMISSION)
+    return fast, slow, atr, trend_exit, trade_log, equity
+
+
+def print_trades(df, atr, trend_exit, trade_log):
+    """Trade-by-trade log of the kernel's fills; signals are one bar before each fill."""
+    close = df['Close'].to_numpy()
+    open_ = df['Open'].to_numpy()
+    stop_atr = FinalProfitableStrategy.params.stop_atr_multiplier
+    for n, (entry, exit_, size, pnl) in enumerate(zip(*trade_log), start=1):
+        signal = entry - 1
+        print(f"\nENTRY: ${close[signal]:.2f} | Size: {size:.0f} | Stop: ${close[signal] - atr[signal] * stop_atr:.2f}")
+        if exit_ < 0:
+            continue
+        reason = "Trend reversal" if trend_exit[exit_ - 1] else "Stop loss"
+        print(f"EXIT: {reason} at ${close[exit_ - 1]:.2f}")
+        result = "WIN" if pnl > 0 else "LOSS"
+        print(f"Trade #{n} [{result}] | P&L: ${pnl:.2f} ({pnl / (open_[entry] * size) * 100:.2f}%)")
+
+
+@dataclass(frozen=True, slots=True)
+class BTResult:
+    """Headline numbers of one backtest."""
+
+    final_value: float
+    total: int  # includes a trade still open at the end
+    wins: int
+    losses: int
+    gross_win: float
+    gross_loss: float
+    sharpe: float
+    max_drawdown: float
+
+    @classmethod
+    def from_kernel(cls, trade_log, equity):
+        """Summarize the strategy kernel's trade arrays and equity curve."""
+        entry_idx, exit_idx, _, pnl = trade_log
+        closed_pnl = pnl[exit_idx >= 0]
+        # Same split as backtrader's TradeAnalyzer: break-even counts as won
+        wins = closed_pnl >= 0.0
+        return cls(
+            final_value=float(equity[-1]),
+            total=len(entry_idx),
+            wins=int(wins.sum()),
+            losses=int((~wins).sum()),
+            gross_win=float(closed_pnl[wins].sum()),
+            gross_loss=float(closed_pnl[~wins].sum()),
+            sharpe=float(sharpe_ratio(equity)),
+            max_drawdown=max_drawdown(equity),
+        )
+
+
+def print_report(r):
     print("\n" + "="*60)
     print("FINAL STRATEGY RESULTS")
     print("="*60)
     
-    total_return = ((final_value - 100000) / 100000) * 100
+    total_return = ((r.final_value - STARTING_CASH) / STARTING_CASH) * 100
     print(f"\nPortfolio:")
-    print(f"  Starting: $100,000.00")
-    print(f"  Final: ${final_value:,.2f}")
+    print(f"  Starting: ${STARTING_CASH:,.2f}")
+    print(f"  Final: ${r.final_value:,.2f}")
     print(f"  Return: {total_return:+.2f}%")
-    print(f"  P&L: ${final_value - 100000:+,.2f}")
-    
-    sharpe = strat.analyzers.sharpe.get_analysis()
-    sharpe_ratio = sharpe.get('sharperatio', 0) or 0
+    print(f"  P&L: ${r.final_value - STARTING_CASH:+,.2f}")
     
-    dd = strat.analyzers.drawdown.get_analysis()
     print(f"\nRisk:")
-    print(f"  Sharpe Ratio: {sharpe_ratio:.2f}")
-    print(f"  Max Drawdown: {dd['max']['drawdown']:.2f}%")
+    print(f"  Sharpe Ratio: {r.sharpe:.2f}")
+    print(f"  Max Drawdown: {r.max_drawdown:.2f}%")
     
-    trades = strat.analyzers.trades.get_analysis()
-    total_trades = trades.get('total', {}).get('total', 0)
+    print(f"\nTrades: {r.total}")
     
-    print(f"\nTrades: {total_trades}")
-    
-    if total_trades > 0:
-        won = trades.get('won', {}).get('total', 0)
-        lost = trades.get('lost', {}).get('total', 0)
-        win_rate = won / total_trades
-        
-        total_won = trades.get('won', {}).get('pnl', {}).get('total', 0)
-        total_lost = abs(trades.get('lost', {}).get('pnl', {}).get('total', 0))
-        profit_factor = total_won / total_lost if total_lost > 0 else float('inf')
+    if r.total > 0:
+        profit_factor = abs(r.gross_win / r.gross_loss) if r.gross_loss != 0 else float('inf')
         
-        print(f"  Won: {won} | Lost: {lost}")
-        print(f"  Win Rate: {win_rate:.2%}")
+        print(f"  Won: {r.wins} | Lost: {r.losses}")
+        print(f"  Win Rate: {r.wins / r.total:.2%}")
         print(f"  Profit Factor: {profit_factor:.2f}")
     
     print("\n" + "="*60)
     print("FINAL COMPARISON")
     print("="*60)
-    print(f"\nOriginal:  $94,498 (-5.50%) | SR: -51.08")
-    print(f"Final:     ${final_value:,.0f} ({total_return:+.2f}%) | SR: {sharpe_ratio:.2f}")
-    print(f"\nImprovement: ${final_value - 94498.28:+,.2f}")
+    print(f"\nOriginal:  $94,498 (-5.50%)")
+    print(f"Final:     ${r.final_value:,.0f} ({total_return:+.2f}%) | SR: {r.sharpe:.2f}")
+    print(f"\nImprovement: ${r.final_value - 94498.28:+,.2f}")
     print("="*60 + "\n")
+
+
+def run_fast(df):
+    """Backtest on NumPy arrays only; every metric comes from the kernel's output."""
+    fast, slow, atr, trend_exit, trade_log, equity = run_kernels(df)
+
+    print(f"Starting: ${STARTING_CASH:,.2f}")
+    print("="*60 + "\n")
+    print_trades(df, atr, trend_exit, trade_log)
+    print_report(BTResult.from_kernel(trade_log, equity))
+
+
+def run_with_plot(df):
+    """Replay the kernel's trades through backtrader's broker, then chart them."""
+    fast, slow, atr, trend_exit, trade_log, equity = run_kernels(df)
+
+    cerebro = bt.Cerebro(stdstats=False)
+    data = bt.feeds.PandasData(dataname=df)
+    cerebro.adddata(data)
+    cerebro.addstrategy(FinalProfitableStrategy, trades=trade_log)
+
+    cerebro.broker.setcash(STARTING_CASH)
+    cerebro.broker.setcommission(commission=COMMISSION)
+
+    cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name='trades')
+
+    print(f"Starting: ${cerebro.broker.getvalue():,.2f}")
+    print("="*60 + "\n")
+    print_trades(df, atr, trend_exit, trade_log)
     
-    try:
-        cerebro.plot(style='candlestick', volume=False)
-    except:
-        pass
+    results = cerebro.run()
+    strat = results[0]
+
+    # Trade stats come from backtrader's broker here, as a cross-check of the kernel
+    trades = strat.analyzers.trades.get_analysis()
+    print_report(BTResult(
+        final_value=cerebro.broker.getvalue(),
+        total=trades.get('total', {}).get('total', 0),
+        wins=trades.get('won', {}).get('total', 0),
+        losses=trades.get('lost', {}).get('total', 0),
+        gross_win=trades.get('won', {}).get('pnl', {}).get('total', 0),
+        gross_loss=trades.get('lost', {}).get('pnl', {}).get('total', 0),
+        sharpe=float(sharpe_ratio(equity)),
+        max_drawdown=max_drawdown(equity),
+    ))
+
+    plot_trades(df, fast, slow, trade_log)
 
 
 if __name__ == "__main__":
-    run_backtest()
+    parser = argparse.ArgumentParser(description="Backtest the EMA trend-following strategy on SPY.")
+    parser.add_argument("--sweep", action="store_true",
+                        help="grid-search the EMA/ATR parameters instead of running a single backtest")
+    parser.add_argument("--plot", action="store_true",
+                        help="replay the trades through backtrader and show a candlestick chart")
+    args = parser.parse_args()
+
+    df = load_data()
+    print(f"Data: {len(df)} bars\n")
+
+    if args.sweep:
+        run_sweep(df)
+    elif args.plot:
+        run_with_plot(df)
+    else:
+        run_fast(df)